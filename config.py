@@ -1,7 +0,0 @@
-import os
-
-# Caminho para a chave de serviço do Google Cloud
-GOOGLE_APPLICATION_CREDENTIALS = "code-ai-469022-9d7d5cebd46f.json"
-
-# Nome do bucket do Google Cloud Storage
-BUCKET_NAME = "planilhas-codecalc"
@@ -1,5 +1,7 @@
 # formatters.py
+import re
 from datetime import datetime
+from functools import lru_cache
 from typing import List, Dict, Optional
 
 EMOJIS = {
@@ -10,10 +12,24 @@ EMOJIS = {
     "servicos": "🛠️🛠️",
 }
 
+# Tabelas de lookup já em casefold (chave única por variante, com e sem acento)
+_EMOJIS_CF = {k.casefold(): v for k, v in EMOJIS.items()}
+_TIPOS_CF = {
+    "imovel": "Imóvel",
+    "imóvel": "Imóvel",
+    "auto": "Auto",
+    "servicos": "Serviços",
+    "serviços": "Serviços",
+}
+
+# Troca "," <-> "." numa única passada (1,234.56 -> 1.234,56)
+_BRL_TRANS = str.maketrans(",.", ".,")
+
 def format_brl(value: float) -> str:
-    s = f"{value:,.2f}"
-    s = s.replace(",", "X").replace(".", ",").replace("X", ".")
-    return f"R$ {s}"
+    return f"R$ {value:,.2f}".translate(_BRL_TRANS)
+
+# Ancorado para aceitar exatamente o que o strptime("%Y-%m-%d") aceitava; o resto passa sem mudança
+_ISO_RE = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2}| \d)$")
 
 def only_ddmm(date_str: str) -> str:
     if not date_str:
@@ -23,13 +39,14 @@ def only_ddmm(date_str: str) -> str:
         return date_str
     if "/" in date_str:
         parts = date_str.split("/")
-        if len(parts) >= 2:
-            return f"{parts[0].zfill(2)}/{parts[1].zfill(2)}"
-    try:
-        dt = datetime.strptime(date_str, "%Y-%m-%d")
-        return dt.strftime("%d/%m")
-    except Exception:
-        pass
+        return f"{parts[0].zfill(2)}/{parts[1].zfill(2)}"
+    m = _ISO_RE.match(date_str)
+    if m:
+        try:
+            dt = datetime(int(m[1]), int(m[2]), int(m[3]))  # valida dia/mês
+            return f"{dt.day:02d}/{dt.month:02d}"
+        except ValueError:
+            pass
     return date_str
 
 def format_parcelas(faixas: List[Dict]) -> str:
@@ -41,23 +58,17 @@ def format_parcelas(faixas: List[Dict]) -> str:
         linhas.append(f"{ini} a {fim}: {format_brl(val)}")
     return "\n".join(linhas)
 
+@lru_cache(maxsize=128)
 def normalize_tipo(tipo: Optional[str]) -> str:
     if not tipo:
         return ""
-    t = tipo.strip().lower()
-    if t in ["imovel", "imóvel"]:
-        return "Imóvel"
-    if t == "auto":
-        return "Auto"
-    if t in ["servicos", "serviços"]:
-        return "Serviços"
-    return tipo.capitalize()
+    return _TIPOS_CF.get(tipo.strip().casefold()) or tipo.capitalize()
 
+@lru_cache(maxsize=128)
 def emojis_for_tipo(tipo: Optional[str]) -> str:
     if not tipo:
         return ""
-    t = tipo.strip().lower()
-    return EMOJIS.get(t, "")
+    return _EMOJIS_CF.get(tipo.strip().casefold(), "")
 
 def block_message(option: Dict) -> str:
     admin = option.get("administradora", "").strip()
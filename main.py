@@ -1,42 +1,79 @@
+import hmac
 import os
-import io
-import json
 import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from typing import Optional, List, Dict, Any
 
-from fastapi import FastAPI, Body
+from fastapi import FastAPI, Body, BackgroundTasks, Header
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+import orjson
 
 # Envio interno de lead (Slack)
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # 🔹 Formatter do padrão CoDE (blocos com 🔵, 🧾, 💰, 💸, 📅)
 #  -> Crie o arquivo formatters.py na RAIZ do repo com o conteúdo que te enviei
-from formatters import join_blocks
+from formatters import join_blocks, format_brl
 
-# Dependências para leitura do GCS (inventário /cartas e /diag)
+# Motor de junções (planilha_processor): leitura do GCS e base normalizada em cache, a mesma
+# para /cartas, /diag e /criar-juncao. Importado na subida do processo, não no 1º request
 try:
     import pandas as pd
-    from google.cloud import storage
+    import planilha_processor as _motor
     HAS_GCS_DEPS = True
 except Exception:
+    _motor = None
     HAS_GCS_DEPS = False
 
-app = FastAPI(title="CoDE.AI Backend")
+# -------------- Resposta JSON via orjson --------------
+class ORJSONResponse(JSONResponse):
+    """
+    Serializa com orjson (bem mais rápido que o json da stdlib e aceita
+    datetime/numpy direto). Definida aqui porque a versão do FastAPI foi descontinuada.
+    """
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+# -------------- Pré-aquecimento --------------
+def _pre_aquecer():
+    """Cria o client do GCS e carrega a base antes do primeiro request de usuário."""
+    if not HAS_GCS_DEPS or not os.getenv("GCP_SERVICE_ACCOUNT_JSON"):
+        return
+    bucket = os.getenv("GCS_BUCKET", "planilhas-codecalc")
+    pref = os.getenv("GCS_PREFIX", "")
+    try:
+        _inventario(bucket, pref)
+    except Exception:
+        pass  # sem pré-aquecimento: o primeiro request carrega normalmente
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # Em thread separada para não atrasar a subida (health check responde na hora)
+    threading.Thread(target=_pre_aquecer, daemon=True).start()
+    yield
+
+app = FastAPI(title="CoDE.AI Backend", default_response_class=ORJSONResponse, lifespan=_lifespan)
 
 # ---------------- CORS ----------------
-# Libera acesso ao frontend do CoDE no WordPress
-origins = [
+# Libera acesso ao frontend do CoDE no WordPress (ALLOWED_ORIGINS, separado por vírgula, sobrescreve)
+_DEFAULT_ORIGINS = ",".join([
     "https://contempladadescomplicada.com.br",
     "https://www.contempladadescomplicada.com.br",
     "http://localhost",  # útil para testes locais
-    "https://code-ai-backend-rcye.onrender.com"  # libera chamadas entre backend e frontend
-]
+    "https://code-ai-backend-rcye.onrender.com",  # libera chamadas entre backend e frontend
+])
+_ALLOWED_ORIGINS = tuple(o.strip() for o in os.getenv("ALLOWED_ORIGINS", _DEFAULT_ORIGINS).split(",") if o.strip())
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=origins,
+    allow_origins=_ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -71,32 +108,6 @@ class LeadPayload(BaseModel):
     origem: Optional[str] = None
     selecao: Selecao
 
-# -------------- Utilitários GCS locais --------------
-def _build_gcs_client():
-    creds_json = os.getenv("GCP_SERVICE_ACCOUNT_JSON")
-    if not creds_json:
-        raise RuntimeError("GCP_SERVICE_ACCOUNT_JSON não configurada no Render.")
-    creds = json.loads(creds_json)
-    return storage.Client.from_service_account_info(creds)
-
-def _read_all_sheets(bucket_name: str, prefix: str = ""):
-    if not HAS_GCS_DEPS:
-        raise RuntimeError("Dependências ausentes. Instale pandas, openpyxl e google-cloud-storage.")
-    client = _build_gcs_client()
-    blobs = list(client.list_blobs(bucket_name, prefix=prefix))
-    frames = []
-    for b in blobs:
-        n = b.name.lower()
-        if not (n.endswith(".xlsx") or n.endswith(".xls")):
-            continue
-        bio = io.BytesIO(b.download_as_bytes())
-        df = pd.read_excel(bio)
-        df["__fonte_blob__"] = b.name
-        frames.append(df)
-    if not frames:
-        return pd.DataFrame()
-    return pd.concat(frames, ignore_index=True)
-
 def _money_to_float(s):
     if s is None:
         return 0.0
@@ -106,35 +117,40 @@ def _money_to_float(s):
     except Exception:
         return 0.0
 
-def _normalizar(df: "pd.DataFrame"):
-    if df is None or df.empty:
-        return df
-    cols = {c.lower(): c for c in df.columns}
-    def pick(*names):
-        for n in names:
-            if n.lower() in cols:
-                return cols[n.lower()]
-        return None
-    adm = pick("Administradora")
-    tipo = pick("Tipo","Destino","Segmento","Bem","Objetivo")
-    credito = pick("Crédito","Credito","Valor Crédito","Valor do Crédito","Valor")
-    entrada_f = pick("Entrada Fornecedor","Entrada Parceiro","Entrada")
-    parcelas = pick("Parcelas")
-    venc = pick("Vencimento","Data de Vencimento")
-
-    out = pd.DataFrame()
-    out["administradora"] = df[adm] if adm else ""
-    out["tipo"] = df[tipo] if tipo else ""
-    out["credito"] = df[credito].apply(_money_to_float) if credito else 0
-    out["entrada_fornecedor"] = df[entrada_f].apply(_money_to_float) if entrada_f else 0
-    out["parcelas_raw"] = df[parcelas] if parcelas else ""
-    out["vencimento"] = pd.to_datetime(df[venc], dayfirst=True, errors="coerce") if venc else pd.NaT
-    out = out.dropna(subset=["administradora","tipo"]).reset_index(drop=True)
-    out["administradora"] = out["administradora"].astype(str).str.strip()
-    out["tipo"] = out["tipo"].astype(str).str.strip()
-    return out
+# -------------- Inventário (/cartas) --------------
+_PREVIEW_MAX = 200
+
+def _prep_cartas(base: "pd.DataFrame") -> List[Dict[str, Any]]:
+    """Preview do /cartas já formatado (coluna a coluna) em tipos nativos, pronto para serializar."""
+    if base is None or base.empty:
+        return []
+    head = base.head(_PREVIEW_MAX)
+    return pd.DataFrame({
+        "administradora": head["administradora"].astype(str),
+        "tipo": head["tipo"].astype(str),
+        "credito": head["credito"].astype(float),
+        "entrada_fornecedor": head["entrada_fornecedor"].astype(float),
+        "parcelas": head["parcelas_raw"].fillna("").astype(str),
+        "vencimento": head["vencimento"].dt.strftime("%d/%m/%Y").fillna(""),
+    }).to_dict(orient="records")
+
+def _inventario(bucket_name: str, prefix: str = "") -> tuple:
+    """
+    (base normalizada, preview do /cartas) da entrada em cache do motor — a mesma base do
+    /criar-juncao e do /diag. O preview é montado uma vez por carga e guardado na entrada.
+    """
+    entry = _motor._carregar_entry(bucket_name, prefix)
+    rows = entry.get("cartas")
+    if rows is None:
+        rows = entry["cartas"] = _prep_cartas(entry["merged"])
+    return entry["merged"], rows
 
 # ---------- Helpers para normalizar opções -> formatter ----------
+# padrão "1 a 12: R$ 1.970,00"
+_PARCELA_FAIXA_RE = re.compile(r"(\d+)\s*a\s*(\d+)\s*:\s*R?\$?\s*([\d\.\,]+)", re.IGNORECASE)
+# padrão "120 x R$ 1.234,56"
+_PARCELA_X_RE = re.compile(r"(\d+)\s*x\s*R?\$?\s*([\d\.\,]+)", re.IGNORECASE)
+
 def _parse_parcelas_to_list(parcelas_val: Any) -> List[Dict[str, Any]]:
     """
     Aceita:
@@ -168,7 +184,7 @@ def _parse_parcelas_to_list(parcelas_val: Any) -> List[Dict[str, Any]]:
         return faixas
 
     # padrão "1 a 12: R$ 1.970,00"
-    for m in re.finditer(r"(\d+)\s*a\s*(\d+)\s*:\s*R?\$?\s*([\d\.\,]+)", s, re.IGNORECASE):
+    for m in _PARCELA_FAIXA_RE.finditer(s):
         ini = int(m.group(1))
         fim = int(m.group(2))
         val = _money_to_float(m.group(3))
@@ -176,7 +192,7 @@ def _parse_parcelas_to_list(parcelas_val: Any) -> List[Dict[str, Any]]:
 
     # padrão "120 x R$ 1.234,56"
     if not faixas:
-        m2 = re.search(r"(\d+)\s*x\s*R?\$?\s*([\d\.\,]+)", s, re.IGNORECASE)
+        m2 = _PARCELA_X_RE.search(s)
         if m2:
             q = int(m2.group(1))
             v = _money_to_float(m2.group(2))
@@ -239,42 +255,86 @@ def health():
 
 # -------------- INVENTÁRIO: /cartas --------------
 @app.get("/cartas")
-def get_cartas(prefix: Optional[str] = None):
+async def get_cartas(prefix: Optional[str] = None):
     if _is_updating():
+        # Base sendo trocada: descarta os caches para recarregar ao sair da manutenção
+        _descartar_caches()
         return {"cartas": [], "info": "Base em atualização. Tente novamente em instantes."}
     try:
         if not HAS_GCS_DEPS:
             return {"cartas": [], "info": "Dependências do GCS ausentes (pandas/google-cloud-storage)."}
         bucket = os.getenv("GCS_BUCKET", "planilhas-codecalc")
         pref = prefix or os.getenv("GCS_PREFIX", "")
-        raw = _read_all_sheets(bucket, pref)
-        base = _normalizar(raw)
+        # Leitura do GCS/planilhas é bloqueante: vai para o threadpool e libera o event loop
+        base, rows = await run_in_threadpool(_inventario, bucket, pref)
         if base is None or base.empty:
             return {"cartas": [], "info": "Nenhuma planilha encontrada no bucket/prefixo."}
 
-        rows: List[dict] = []
-        for _, r in base.iterrows():
-            rows.append({
-                "administradora": str(r.get("administradora","")),
-                "tipo": str(r.get("tipo","")),
-                "credito": float(r.get("credito",0) or 0),
-                "entrada_fornecedor": float(r.get("entrada_fornecedor",0) or 0),
-                "parcelas": str(r.get("parcelas_raw","")),
-                "vencimento": ("" if r.get("vencimento") is None or pd.isna(r.get("vencimento"))
-                               else r.get("vencimento").strftime("%d/%m/%Y")),
-            })
-        return {"cartas": rows[:200], "info": f"{len(rows)} registros totais (preview até 200)."}
+        # Preview formatado uma vez por carga da base (fica na entrada em cache do motor);
+        # já são tipos nativos: devolve direto, sem a passada do jsonable_encoder
+        return ORJSONResponse({"cartas": rows, "info": f"{len(base)} registros totais (preview até {_PREVIEW_MAX})."})
     except Exception as e:
         return {"erro": str(e)}
 
+# -------------- Cache curto de resultados da junção --------------
+# Mesmos parâmetros -> mesmo resultado enquanto a base não muda (faixas de crédito prontas do front)
+# LRU: acerto vai para o fim; ao passar de _JUNCAO_MAX saem primeiro os vencidos, depois os menos usados
+_JUNCAO_CACHE: "OrderedDict[tuple, tuple]" = OrderedDict()  # chave -> (momento, resultado)
+_JUNCAO_LOCK = threading.Lock()
+_JUNCAO_MAX = 1024
+_NOCACHE_PREFIX = "nocache"  # prefix="nocache" força recálculo (e usa o prefixo padrão)
+
+def _descartar_caches():
+    # Base em cache do motor (/cartas, /diag, /criar-juncao) e resultados de junção juntos:
+    # nenhum endpoint fica mostrando a base antiga enquanto outro já vê a nova
+    _JUNCAO_CACHE.clear()
+    if _motor is not None:
+        _motor.limpar_cache()
+
+def _juncao_ttl() -> float:
+    return float(os.getenv("JUNCAO_TTL", "60"))
+
+def _sem_none(v: Any) -> Any:
+    # Equivalente ao response_model_exclude_none (que só vale com response_model):
+    # tira as chaves None antes de montar a resposta direta em orjson
+    if isinstance(v, dict):
+        return {k: _sem_none(x) for k, x in v.items() if x is not None}
+    if isinstance(v, list):
+        return [_sem_none(x) for x in v]
+    return v
+
+def _juncao_cache_get(key: tuple):
+    with _JUNCAO_LOCK:
+        hit = _JUNCAO_CACHE.get(key)
+        if hit is None:
+            return None
+        if time.monotonic() - hit[0] >= _juncao_ttl():
+            del _JUNCAO_CACHE[key]
+            return None
+        _JUNCAO_CACHE.move_to_end(key)
+        return hit[1]
+
+def _juncao_cache_put(key: tuple, resultado: Any):
+    with _JUNCAO_LOCK:
+        now = time.monotonic()
+        _JUNCAO_CACHE[key] = (now, resultado)
+        _JUNCAO_CACHE.move_to_end(key)
+        if len(_JUNCAO_CACHE) > _JUNCAO_MAX:
+            ttl = _juncao_ttl()
+            for k in [k for k, (ts, _) in _JUNCAO_CACHE.items() if now - ts >= ttl]:
+                del _JUNCAO_CACHE[k]
+        while len(_JUNCAO_CACHE) > _JUNCAO_MAX:
+            _JUNCAO_CACHE.popitem(last=False)
+
 # -------------- JUNÇÃO: /criar-juncao --------------
 @app.post("/criar-juncao")
-def criar_juncao(req: RequisicaoJuncao):
+async def criar_juncao(req: RequisicaoJuncao):
     if _is_updating():
+        _descartar_caches()
         return {"erro": "manutencao", "detalhe": "Base em atualização. Tente novamente em instantes."}
 
     if req.comissao_extra is None:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=400,
             content={
                 "erro": "COMISSAO_REQUERIDA",
@@ -285,23 +345,37 @@ def criar_juncao(req: RequisicaoJuncao):
             }
         )
 
+    usar_cache = req.prefix != _NOCACHE_PREFIX
+    prefix = req.prefix if usar_cache else None
+    key = (req.tipo, req.credito_desejado, req.entrada_max, req.comissao_extra, prefix)
+    if usar_cache:
+        hit = _juncao_cache_get(key)
+        if hit is not None:
+            return ORJSONResponse(hit)
+
     try:
-        from planilha_processor import criar_juncao_sob_demanda as _criar
-        resultado = _criar(
+        if _motor is None:
+            return {"erro": "motor de junções indisponível"}
+        resultado = await run_in_threadpool(
+            _motor.criar_juncao_sob_demanda,
             tipo=req.tipo,
             credito_desejado=req.credito_desejado,
             entrada_max=req.entrada_max,
             comissao_extra=req.comissao_extra,
-            prefix=req.prefix,
+            prefix=prefix,
             return_private=False
         )
-        return resultado
+        # Resposta já sem None e em tipos que o orjson serializa: sem a passada do jsonable_encoder
+        resultado = _sem_none(resultado)
+        if usar_cache:
+            _juncao_cache_put(key, resultado)
+        return ORJSONResponse(resultado)
     except Exception as e:
         return {"erro": str(e)}
 
 # -------------- JUNÇÃO FORMATADA: /criar-juncao-formatado --------------
 @app.post("/criar-juncao-formatado")
-def criar_juncao_formatado(payload: Dict[str, Any] = Body(...)):
+async def criar_juncao_formatado(payload: Dict[str, Any] = Body(...)):
     """
     Endpoint para o chat do site.
     Aceita tanto 'prompt' livre quanto parâmetros explícitos.
@@ -322,11 +396,14 @@ def criar_juncao_formatado(payload: Dict[str, Any] = Body(...)):
     opcoes_norm: List[Dict[str, Any]] = []
     try:
         # Tenta usar o gerador real
-        from planilha_processor import criar_juncao_sob_demanda as _criar
+        if _motor is None:
+            raise RuntimeError("motor de junções indisponível")
+        _criar = _motor.criar_juncao_sob_demanda
         # Se não veio 'tipo' e 'credito_desejado', o gerador pode usar 'prompt' livre (se você implementou).
         # Caso contrário, passamos os parâmetros tradicionais.
         if tipo and credito_desejado:
-            resultado = _criar(
+            resultado = await run_in_threadpool(
+                _criar,
                 tipo=tipo,
                 credito_desejado=credito_desejado,
                 entrada_max=entrada_max,
@@ -336,7 +413,8 @@ def criar_juncao_formatado(payload: Dict[str, Any] = Body(...)):
             )
         else:
             # Tentativa com prompt livre (se sua função suportar). Se não suportar, vai lançar exceção e cairemos no exemplo.
-            resultado = _criar(
+            resultado = await run_in_threadpool(
+                _criar,
                 tipo=tipo or "",
                 credito_desejado=float(credito_desejado or 0),
                 entrada_max=entrada_max,
@@ -408,13 +486,26 @@ def criar_juncao_formatado(payload: Dict[str, Any] = Body(...)):
         return {"reply": texto, "count": len(exemplos), "debug": str(e)}
 
 # -------------- LEAD: /lead --------------
-@app.post("/lead")
-def receber_lead(payload: LeadPayload):
+# Sessão única para o webhook: keep-alive reaproveita a conexão TLS entre leads.
+# Retry só em falha de conexão (POST não é repetido após envio).
+_SLACK_SESSION = requests.Session()
+_SLACK_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                             max_retries=Retry(total=2, backoff_factor=0.2)))
+
+def _post_slack(url: str, text: str):
+    # Roda depois da resposta (BackgroundTasks): falha no Slack não afeta o lead
+    try:
+        _SLACK_SESSION.post(url, data=orjson.dumps({"text": text}),
+                            headers={"Content-Type": "application/json"}, timeout=10)
+    except Exception:
+        pass
+
+@app.post("/lead", response_class=ORJSONResponse)
+def receber_lead(payload: LeadPayload, background_tasks: BackgroundTasks):
     admin_webhook = os.getenv("ADMIN_WEBHOOK", "")
     escolhida: Dict[str, Any] = None
     try:
-        from planilha_processor import criar_juncao_sob_demanda as _criar
-        resultado = _criar(
+        resultado = _motor.criar_juncao_sob_demanda(
             tipo=payload.selecao.tipo,
             credito_desejado=payload.selecao.credito_desejado,
             entrada_max=payload.selecao.entrada_max,
@@ -438,18 +529,18 @@ def receber_lead(payload: LeadPayload):
         "",
         "*Solicitação:*",
         f"- Tipo: {payload.selecao.tipo}",
-        f"- Crédito desejado: R$ {payload.selecao.credito_desejado:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
+        f"- Crédito desejado: {format_brl(payload.selecao.credito_desejado)}",
         f"- Comissão variável: {payload.selecao.comissao_extra*100:.2f}% (fixo plataforma: 5%)",
     ]
     if escolhida:
-        pol = f"{(0.05+payload.selecao.comissao_extra)*100:.2f}%"
+        pol = f"{(0.05+payload.selecao.comissao_extra)*100:.2f}%".replace(".", ",")
         txt += [
             "",
             "*Junção selecionada:*",
             f"- solution_id: {escolhida.get('solution_id')}",
             f"- Administradora/Tipo: {escolhida.get('administradora')} / {escolhida.get('tipo')}",
-            f"- Crédito total: R$ {escolhida.get('credito_total'):,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
-            f"- Entrada (c/ comissão total {pol}): R$ {escolhida.get('entrada'):,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
+            f"- Crédito total: {format_brl(escolhida.get('credito_total'))}",
+            f"- Entrada (c/ comissão total {pol}): {format_brl(escolhida.get('entrada'))}",
             f"- Cartas usadas: {escolhida.get('cartas_usadas')}",
             f"- Parcelas: {escolhida.get('parcelas')}",
         ]
@@ -465,20 +556,46 @@ def receber_lead(payload: LeadPayload):
             for i in range(len(creditos)):
                 linha = (
                     f"  • Fornecedor: {fornecedores[i] or '-'} | "
-                    f"Crédito: R$ {creditos[i]:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-                    + f" | Venc.: {vencs[i] or '-'} | Fonte: {blobs[i]}"
+                    f"Crédito: {format_brl(creditos[i])}"
+                    f" | Venc.: {vencs[i] or '-'} | Fonte: {blobs[i]}"
                 )
                 if i < len(parcelas) and parcelas[i]:
                     linha += f" | Parcelas: {parcelas[i]}"
                 txt.append(linha)
 
     if admin_webhook:
-        try:
-            requests.post(admin_webhook, json={"text": "\n".join(txt)}, timeout=10)
-        except Exception:
-            pass
-
-    return {"ok": True, "message": "Recebemos seus dados. Um consultor CoDE entrará em contato."}
+        background_tasks.add_task(_post_slack, admin_webhook, "\n".join(txt))
+
+    # Resposta montada direto: sem passar pelo jsonable_encoder/validação de saída
+    return ORJSONResponse({"ok": True, "message": "Recebemos seus dados. Um consultor CoDE entrará em contato."})
+
+# -------------- ADMIN: /cache/invalidate e /admin/reindex --------------
+def _admin_ok(x_admin_token: Optional[str]) -> bool:
+    token = os.getenv("ADMIN_TOKEN", "")
+    # comparação em tempo constante: não vaza o token por tempo de resposta
+    return bool(token) and x_admin_token is not None and hmac.compare_digest(x_admin_token.encode(), token.encode())
+
+_NAO_AUTORIZADO = {"ok": False, "erro": "nao_autorizado"}
+
+@app.post("/cache/invalidate")
+def invalidar_cache(x_admin_token: Optional[str] = Header(None)):
+    """Descarta os caches em memória (inventário e junções). Exige ADMIN_TOKEN."""
+    if not _admin_ok(x_admin_token):
+        return ORJSONResponse(status_code=403, content=_NAO_AUTORIZADO)
+    _descartar_caches()
+    return {"ok": True}
+
+@app.post("/admin/reindex")
+def reindexar(prefix: Optional[str] = None, x_admin_token: Optional[str] = Header(None)):
+    """Gera as cópias Parquet normalizadas das planilhas (leitura bem mais rápida que .xlsx)."""
+    if not _admin_ok(x_admin_token):
+        return ORJSONResponse(status_code=403, content=_NAO_AUTORIZADO)
+    try:
+        bucket = os.getenv("GCS_BUCKET", "planilhas-codecalc")
+        pref = prefix or os.getenv("GCS_PREFIX", "")
+        return {"ok": True, **_motor.reindexar_parquet(bucket, pref)}
+    except Exception as e:
+        return {"ok": False, "erro": str(e)}
 
 # -------------- DIAGNÓSTICO: /diag --------------
 @app.get("/diag")
@@ -488,15 +605,19 @@ def diag():
             return {"ok": False, "error": "Dependências ausentes (pandas/google-cloud-storage)."}
         bucket = os.getenv("GCS_BUCKET","planilhas-codecalc")
         pref = os.getenv("GCS_PREFIX","")
-        raw = _read_all_sheets(bucket, pref)
-        if raw is None or raw.empty:
+        # Cabeçalho de cada planilha como lida, guardado na mesma entrada em cache do /cartas
+        partes = [cab for _, _, cab in _motor._carregar_entry(bucket, pref)["blobs"].values()]
+        rows = sum(n for _, n in partes)
+        if not rows:
             return {"ok": True, "bucket": bucket, "prefix": pref, "rows_detected": 0, "columns": []}
+        # colunas na ordem em que aparecem nas planilhas (sem repetir)
+        colunas = list(dict.fromkeys(c for cols, _ in partes for c in cols))
         return {
             "ok": True,
             "bucket": bucket,
             "prefix": pref,
-            "rows_detected": len(raw),
-            "columns": list(raw.columns)[:20],
+            "rows_detected": rows,
+            "columns": colunas[:20],
         }
     except Exception as e:
         return {"ok": False, "error": str(e)}
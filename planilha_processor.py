@@ -1,74 +1,203 @@
 # planilha_processor.py
-import os, io, json, math, hashlib
+import os, io, math, hashlib, threading, time, multiprocessing, logging
 from typing import Optional, List, Tuple, Dict, Any
+import orjson
+import numpy as np
 import pandas as pd
 from google.cloud import storage
-from itertools import combinations
+from google.api_core.exceptions import Unauthorized
+from google.auth.exceptions import RefreshError
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_log = logging.getLogger(__name__)
 
 # =========================
 # Infra GCS
 # =========================
+# Client único por processo: reaproveita sessão HTTP/TLS e token entre requests.
+@lru_cache(maxsize=1)
 def _build_client():
-    creds = json.loads(os.getenv("GCP_SERVICE_ACCOUNT_JSON"))
-    return storage.Client.from_service_account_info(creds)
+    creds_json = os.getenv("GCP_SERVICE_ACCOUNT_JSON")
+    if not creds_json:
+        raise RuntimeError("GCP_SERVICE_ACCOUNT_JSON não configurada no Render.")
+    return storage.Client.from_service_account_info(orjson.loads(creds_json))
+
+# Resposta parcial da listagem: só os metadados usados (metadata: generation de origem do Parquet)
+_LIST_FIELDS = "items(name,generation,updated,size,metadata),nextPageToken"
 
-def _read_all_sheets(bucket, prefix=""):
+# Planilhas aceitas; o glob (.xls*) é aplicado no servidor pelo GCS e o
+# VALID_EXT confirma a extensão exata
+VALID_EXT = (".xlsx", ".xls")
+_SHEET_GLOB = "**.[xX][lL][sS]*"
+
+def _list(bucket: str, prefix: str, match_glob: Optional[str]):
     client = _build_client()
-    frames = []
-    for b in client.list_blobs(bucket, prefix=prefix):
-        n = b.name.lower()
-        if n.endswith(".xlsx") or n.endswith(".xls"):
-            df = pd.read_excel(io.BytesIO(b.download_as_bytes()))
-            df["__fonte_blob__"] = b.name
-            frames.append(df)
-    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if match_glob:
+        try:
+            return list(client.list_blobs(bucket, prefix=prefix, fields=_LIST_FIELDS, match_glob=match_glob))
+        except TypeError:
+            pass  # google-cloud-storage < 2.10: sem match_glob
+    return list(client.list_blobs(bucket, prefix=prefix, fields=_LIST_FIELDS))
+
+def _list_blobs(bucket: str, prefix: str = "", match_glob: Optional[str] = None):
+    try:
+        return _list(bucket, prefix, match_glob)
+    except (RefreshError, Unauthorized):
+        # credencial rotacionada/expirada: recria o client e tenta uma vez
+        _build_client.cache_clear()
+        return _list(bucket, prefix, match_glob)
+
+def _download_bytes(b) -> bytes:
+    # Planilha só leitura: um único GET, sem decodificação nem verificação CRC32C no cliente
+    try:
+        return b.download_as_bytes(raw_download=True, single_shot_download=True, checksum=None)
+    except TypeError:
+        # google-cloud-storage antigo (sem single_shot_download)
+        return b.download_as_bytes()
+
+def _read_sheet(b) -> pd.DataFrame:
+    # BytesIO sobre o bytes baixado não copia o buffer; o calamine precisa do arquivo
+    # inteiro (zip com diretório no fim), então não há ganho em ler em streaming
+    data = _download_bytes(b)
+    try:
+        # calamine (Rust) é bem mais rápido que o openpyxl e também lê .xls
+        df = pd.read_excel(io.BytesIO(data), engine="calamine")
+    except (ImportError, ValueError):
+        # sem python-calamine ou pandas < 2.2
+        df = pd.read_excel(io.BytesIO(data))
+    df["__fonte_blob__"] = b.name
+    return df
+
+# Cópia Parquet (já normalizada) de cada planilha: <_PARQUET_DIR><blob>.parquet
+_PARQUET_DIR = "_parquet/"
+_BASE_COLS = ["administradora", "tipo", "credito", "entrada_fornecedor",
+              "parcelas_raw", "vencimento", "fornecedor", "fonte", "uid"]
+
+def _parquet_name(blob_name: str) -> str:
+    return f"{_PARQUET_DIR}{blob_name}.parquet"
+
+def _cabecalho(raw: pd.DataFrame) -> Tuple[List[str], int]:
+    # (colunas, linhas) da planilha como lida, antes do _normalizar — é o que o /diag mostra
+    return [str(c) for c in raw.columns], len(raw)
+
+def _read_parquet_sibling(sib) -> Tuple[pd.DataFrame, Tuple[List[str], int]]:
+    df = pd.read_parquet(io.BytesIO(_download_bytes(sib)), columns=_BASE_COLS)
+    meta = sib.metadata or {}
+    if "source_columns" in meta:
+        return df, (orjson.loads(meta["source_columns"]), int(meta.get("source_rows", len(df))))
+    return df, (list(df.columns), len(df))  # cópia gerada antes de guardar o cabeçalho
+
+def _write_parquet_sibling(bucket, b, df: pd.DataFrame, cabecalho: Tuple[List[str], int]):
+    # df sai do _normalizar já com as colunas texto em str: o Parquet volta idêntico
+    buf = io.BytesIO()
+    df.to_parquet(buf, engine="pyarrow", compression="zstd", index=False)
+    sib = bucket.blob(_parquet_name(b.name))
+    sib.metadata = {"source_generation": str(b.generation),
+                    "source_columns": orjson.dumps(cabecalho[0]).decode(),
+                    "source_rows": str(cabecalho[1])}
+    sib.upload_from_string(buf.getvalue(), content_type="application/octet-stream")
 
 # =========================
 # Normalização
 # =========================
-def _money_to_float(s):
-    if s is None: return 0.0
-    v = str(s).replace("R$", "").replace(".", "").replace(",", ".").strip()
-    try: return float(v)
-    except Exception: return 0.0
-
-def _pick(cols_map, *names):
-    for n in names:
-        if n.lower() in cols_map:
-            return cols_map[n.lower()]
-    return None
-
-def _uid_row(r: pd.Series) -> str:
-    base = "|".join([
-        str(r.get("administradora","")).strip(),
-        str(r.get("tipo","")).strip(),
-        f'{float(r.get("credito",0.0) or 0.0):.2f}',
-        str(r.get("parcelas_raw","")).strip(),
-        ("" if pd.isna(r.get("vencimento", None)) else r.get("vencimento").strftime("%Y-%m-%d")),
-        str(r.get("fornecedor","")).strip(),
-        str(r.get("fonte","")).strip(),
-    ])
-    return hashlib.sha1(base.encode("utf-8")).hexdigest()
+def _money_series(s: pd.Series) -> pd.Series:
+    """
+    Valor monetário da coluna inteira: texto ("R$ 1.234,56") sem milhar e com vírgula decimal;
+    células que já vieram numéricas da planilha entram como estão.
+    """
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype(float).fillna(0.0)
+    texto = s.map(type) == str
+    out = pd.to_numeric(s.where(~texto), errors="coerce").astype(float)
+    if texto.any():
+        limpo = (s[texto].astype(str)
+                 .str.replace("R$", "", regex=False)
+                 .str.replace(".", "", regex=False)
+                 .str.replace(",", ".", regex=False)
+                 .str.strip())
+        out[texto] = pd.to_numeric(limpo, errors="coerce")
+    return out.fillna(0.0)
+
+def _date_series(s: pd.Series) -> pd.Series:
+    # Células de data chegam como datetime64 (read_excel) ou como objetos date/datetime
+    # numa coluna object (calamine to_python, openpyxl): conversão direta. Só o texto
+    # ("10/10/2025") precisa do parse dayfirst, que é caro (fallback em Python).
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    if pd.api.types.infer_dtype(s, skipna=True) in ("date", "datetime", "datetime64"):
+        return pd.to_datetime(s, errors="coerce")
+    return pd.to_datetime(s, dayfirst=True, errors="coerce")
+
+# Sinônimos aceitos para cada coluna da planilha (o primeiro que existir vence).
+# Resolvidos planilha a planilha: cada arquivo do bucket pode ter o seu cabeçalho.
+_COLUNAS: Dict[str, tuple] = {
+    "administradora": ("Administradora",),
+    "tipo": ("Tipo", "Destino", "Segmento", "Bem", "Objetivo"),
+    "credito": ("Crédito", "Credito", "Valor Crédito", "Valor do Crédito", "Valor"),
+    "entrada_fornecedor": ("Entrada Fornecedor", "Entrada Parceiro", "Entrada"),
+    "parcelas": ("Parcelas",),
+    "vencimento": ("Vencimento", "Data de Vencimento"),
+    "fornecedor": ("Fornecedor", "Parceiro"),  # interno only
+}
+
+@lru_cache(maxsize=64)
+def _resolve_columns(columns: tuple) -> Dict[str, Optional[str]]:
+    """
+    Coluna de origem que atende cada campo de _COLUNAS (ou None). As planilhas
+    repetem o mesmo cabeçalho, então o resultado é memoizado pela tupla de colunas.
+    """
+    cols = {str(c).lower(): c for c in columns}
+    return {
+        campo: next((cols[n.lower()] for n in nomes if n.lower() in cols), None)
+        for campo, nomes in _COLUNAS.items()
+    }
+
+def _uids(out: pd.DataFrame) -> List[str]:
+    """
+    sha1 de "adm|tipo|credito|parcelas|vencimento|fornecedor|fonte" por linha: monta a
+    chave coluna a coluna e só o hash fica num laço (mesmo texto do antigo apply por linha).
+    """
+    if out.empty:
+        return []
+    def txt(col):
+        return out[col].map(str).str.strip()
+    venc = out["vencimento"]
+    if pd.api.types.is_datetime64_any_dtype(venc):
+        venc = venc.dt.strftime("%Y-%m-%d").fillna("")
+    else:
+        venc = venc.map(lambda x: "" if pd.isna(x) else x.strftime("%Y-%m-%d"))
+    chave = (txt("administradora") + "|" + txt("tipo") + "|"
+             + out["credito"].map(lambda v: f"{float(v or 0.0):.2f}") + "|"
+             + txt("parcelas_raw") + "|" + venc + "|" + txt("fornecedor") + "|" + txt("fonte"))
+    return [hashlib.sha1(k.encode("utf-8")).hexdigest() for k in chave.tolist()]
+
+_COLS_TEXTO = ("parcelas_raw", "fornecedor")
 
 def _normalizar(df: pd.DataFrame):
+    """
+    Normaliza UMA planilha (a base do /cartas e das junções sai daqui). Sem coluna de
+    administradora as linhas são descartadas; sem coluna de tipo ficam com tipo "".
+    """
     if df is None or df.empty: return df
-    cols = {c.lower(): c for c in df.columns}
-
-    administradora = _pick(cols, "Administradora")
-    tipo          = _pick(cols, "Tipo","Destino","Segmento","Bem","Objetivo")
-    credito       = _pick(cols, "Crédito","Credito","Valor Crédito","Valor do Crédito","Valor")
-    entrada_f     = _pick(cols, "Entrada Fornecedor","Entrada Parceiro","Entrada")
-    parcelas      = _pick(cols, "Parcelas")
-    venc          = _pick(cols, "Vencimento","Data de Vencimento")
-    fornecedor    = _pick(cols, "Fornecedor","Parceiro")  # interno only
-
-    out = pd.DataFrame()
-    out["administradora"]     = df[administradora] if administradora else ""
+    m = _resolve_columns(tuple(df.columns))
+    administradora = m["administradora"]
+    tipo          = m["tipo"]
+    credito       = m["credito"]
+    entrada_f     = m["entrada_fornecedor"]
+    parcelas      = m["parcelas"]
+    venc          = m["vencimento"]
+    fornecedor    = m["fornecedor"]
+
+    out = pd.DataFrame(index=df.index)
+    out["administradora"]     = df[administradora] if administradora else None
     out["tipo"]               = df[tipo] if tipo else ""
-    out["credito"]            = df[credito].apply(_money_to_float) if credito else 0
-    out["entrada_fornecedor"] = df[entrada_f].apply(_money_to_float) if entrada_f else 0
+    out["credito"]            = _money_series(df[credito]) if credito else 0
+    out["entrada_fornecedor"] = _money_series(df[entrada_f]) if entrada_f else 0
     out["parcelas_raw"]       = df[parcelas] if parcelas else ""
-    out["vencimento"]         = pd.to_datetime(df[venc], dayfirst=True, errors="coerce") if venc else pd.NaT
+    out["vencimento"]         = _date_series(df[venc]) if venc else pd.NaT
     out["fornecedor"]         = df[fornecedor] if fornecedor else ""
     out["fonte"]              = df.get("__fonte_blob__", "")
 
@@ -76,9 +205,183 @@ def _normalizar(df: pd.DataFrame):
     out["administradora"] = out["administradora"].astype(str).str.strip()
     out["tipo"]           = out["tipo"].astype(str).str.strip()
 
-    out["uid"] = out.apply(_uid_row, axis=1)  # id estável (nunca expõe dado sensível)
+    out["uid"] = _uids(out)  # id estável (nunca expõe dado sensível)
+    # Parcelas/fornecedor com células numéricas (120) viram texto ("120"), vazio continua
+    # nulo — o mesmo que volta da cópia Parquet (depois do uid, que já usa str(valor))
+    for c in _COLS_TEXTO:
+        out[c] = out[c].astype(str)
     return out
 
+def _fetch_normalized(blobs: List[Any], siblings: Optional[Dict[str, Any]] = None) -> List[Tuple[pd.DataFrame, Tuple[List[str], int]]]:
+    """
+    Baixa + normaliza cada blob, devolvendo (df normalizado, cabeçalho); com mais de um,
+    em paralelo (I/O de rede solta o GIL). Se existir a cópia Parquet gerada a partir da
+    mesma generation, lê só ela.
+    """
+    siblings = siblings or {}
+    def one(b):
+        sib = siblings.get(_parquet_name(b.name))
+        if sib is not None and (sib.metadata or {}).get("source_generation") == str(b.generation):
+            try:
+                return _read_parquet_sibling(sib)
+            except Exception:
+                pass  # Parquet ilegível/sem pyarrow: cai no .xlsx
+        raw = _read_sheet(b)
+        return _normalizar(raw), _cabecalho(raw)
+    if len(blobs) <= 1:
+        return [one(b) for b in blobs]
+    workers = min(int(os.getenv("GCS_CONCURRENCY", "16")), len(blobs))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        return list(ex.map(one, blobs))
+
+# =========================
+# Cache da base normalizada
+# =========================
+# (bucket, prefix) -> {"ts": momento da última checagem,
+#                      "blobs": {nome: (generation, df normalizado, (colunas, linhas) lidas)},
+#                      "merged": base normalizada completa,
+#                      "grupos": {(administradora, tipo): (sub-DataFrame, valores do solver)},
+#                      "por_tipo": {tipo em minúsculas: mesmo formato de "grupos"},
+#                      "cartas": preview do /cartas, guardado pelo main.py na 1ª leitura}
+# LRU limitado a _SHEET_MAX prefixos (o prefixo vem do request): sai o menos usado
+_SHEET_CACHE: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+_SHEET_LOCK = threading.Lock()      # carga da base (lento: lista e baixa do GCS)
+_SHEET_LRU_LOCK = threading.Lock()  # só a ordem do LRU (rápido: acerto não espera carga)
+_SHEET_MAX = 16
+
+def _guardar_entry(key: Tuple[str, str], entry: Dict[str, Any]) -> Dict[str, Any]:
+    with _SHEET_LRU_LOCK:
+        _SHEET_CACHE[key] = entry
+        _SHEET_CACHE.move_to_end(key)
+        while len(_SHEET_CACHE) > _SHEET_MAX:
+            _SHEET_CACHE.popitem(last=False)
+    return entry
+
+def _valores_grupo(grp: pd.DataFrame) -> Tuple[Tuple[float, int], ...]:
+    # (crédito, posição no grupo) das cartas com crédito > 0 — entrada do _min_cover
+    # (tupla: também serve de chave do cache de soluções)
+    cred = grp["credito"].to_numpy(dtype=np.float64, na_value=np.nan)
+    pos = np.flatnonzero(cred > 0)
+    return tuple(zip(cred[pos].tolist(), pos.tolist()))
+
+_COLS_CATEGORIA = ("administradora", "tipo", "fonte")
+
+def _indexar_grupos(merged: pd.DataFrame) -> Dict[Tuple[Any, Any], Tuple[pd.DataFrame, Tuple[Tuple[float, int], ...]]]:
+    # Mesma ordem/chaves do groupby que o motor fazia a cada request; os valores do
+    # solver de cada grupo saem junto, uma vez por carga da base
+    if merged.empty:
+        return {}
+    return {k: (g, _valores_grupo(g))
+            for k, g in merged.groupby(["administradora", "tipo"], dropna=False, observed=True)}
+
+def _indexar_tipos(grupos: Dict[Tuple[Any, Any], Any]) -> Dict[str, Dict[Tuple[Any, Any], Any]]:
+    # tipo já em minúsculas -> grupos desse tipo (o filtro por tipo vira um lookup)
+    por_tipo: Dict[str, Dict[Tuple[Any, Any], Any]] = {}
+    for k, g in grupos.items():
+        if isinstance(k[1], str):
+            por_tipo.setdefault(k[1].lower(), {})[k] = g
+    return por_tipo
+
+def _carregar_entry(bucket: str, prefix: str = "") -> Dict[str, Any]:
+    """
+    Base normalizada de (bucket, prefix) com cache em memória.
+    Dentro do TTL (INV_TTL, padrão 300s) não consulta o GCS; depois relista os
+    blobs e só baixa/normaliza os que são novos ou mudaram de generation.
+    """
+    ttl = float(os.getenv("INV_TTL", "300"))
+    key = (bucket, prefix)
+    entry = _SHEET_CACHE.get(key)
+    if entry and time.monotonic() - entry["ts"] < ttl:
+        with _SHEET_LRU_LOCK:
+            if key in _SHEET_CACHE:
+                _SHEET_CACHE.move_to_end(key)
+        return entry
+
+    with _SHEET_LOCK:
+        # outro request pode ter recarregado enquanto esperávamos o lock
+        entry = _SHEET_CACHE.get(key)
+        if entry and time.monotonic() - entry["ts"] < ttl:
+            return entry
+
+        anteriores = entry["blobs"] if entry else {}
+        blobs: Dict[str, Tuple[int, pd.DataFrame, Tuple[List[str], int]]] = {}
+        to_fetch = []
+        for b in _list_blobs(bucket, prefix, _SHEET_GLOB):
+            if not b.name.lower().endswith(VALID_EXT):
+                continue
+            hit = anteriores.get(b.name)
+            if hit is not None and hit[0] == b.generation:
+                blobs[b.name] = hit
+            else:
+                blobs[b.name] = None  # mantém a ordem da listagem
+                to_fetch.append(b)
+
+        siblings = {}
+        if to_fetch:
+            siblings = {sb.name: sb for sb in _list_blobs(bucket, _PARQUET_DIR + prefix)}
+        for b, (df, cab) in zip(to_fetch, _fetch_normalized(to_fetch, siblings)):
+            blobs[b.name] = (b.generation, df, cab)
+        mudou = bool(to_fetch)
+
+        if entry and not mudou and blobs.keys() == anteriores.keys():
+            # mesma base: mantém também o que já foi derivado dela (ex.: preview do /cartas)
+            return _guardar_entry(key, {**entry, "ts": time.monotonic(), "blobs": blobs})
+
+        frames = [df for _, df, _ in blobs.values() if df is not None and not df.empty]
+        # Todas as partes saem de _normalizar com as mesmas colunas: sem sort nem reindex.
+        # (copy= não é passado: no pandas 3 é no-op e está deprecado — CoW já evita a cópia.)
+        merged = pd.concat(frames, ignore_index=True, sort=False) if frames else pd.DataFrame()
+        # Poucos valores distintos repetidos em todas as linhas: categórico (códigos inteiros)
+        # depois do concat — categorias diferentes por planilha voltariam a texto no concat
+        for c in _COLS_CATEGORIA:
+            if c in merged:
+                merged[c] = merged[c].astype("category")
+        grupos = _indexar_grupos(merged)
+        por_tipo = _indexar_tipos(grupos)
+        return _guardar_entry(key, {"ts": time.monotonic(), "blobs": blobs, "merged": merged,
+                                    "grupos": grupos, "por_tipo": por_tipo})
+
+def _carregar_base(bucket: str, prefix: str = "") -> pd.DataFrame:
+    return _carregar_entry(bucket, prefix)["merged"]
+
+def _carregar_grupos(bucket: str, prefix: str = "",
+                     tipo: Optional[str] = None) -> Dict[Tuple[Any, Any], Tuple[pd.DataFrame, Tuple[Tuple[float, int], ...]]]:
+    """
+    Índice {(administradora, tipo): (cartas, valores do solver)} da base em cache (lookup
+    O(1) por grupo); com tipo, só os grupos desse tipo (sem diferenciar maiúsculas).
+    """
+    entry = _carregar_entry(bucket, prefix)
+    if tipo:
+        return entry["por_tipo"].get(str(tipo).lower(), {})
+    return entry["grupos"]
+
+def limpar_cache():
+    with _SHEET_LOCK, _SHEET_LRU_LOCK:
+        _SHEET_CACHE.clear()
+
+def reindexar_parquet(bucket: str, prefix: str = "") -> Dict[str, Any]:
+    """
+    Gera/atualiza a cópia Parquet normalizada de cada planilha do prefixo.
+    Planilhas cuja cópia já corresponde à generation atual são puladas.
+    """
+    bkt = _build_client().bucket(bucket)
+    siblings = {sb.name: sb for sb in _list_blobs(bucket, _PARQUET_DIR + prefix)}
+    gerados, pulados = [], 0
+    for b in _list_blobs(bucket, prefix, _SHEET_GLOB):
+        if b.name.startswith(_PARQUET_DIR) or not b.name.lower().endswith(VALID_EXT):
+            continue
+        sib = siblings.get(_parquet_name(b.name))
+        if sib is not None and (sib.metadata or {}).get("source_generation") == str(b.generation):
+            pulados += 1
+            continue
+        raw = _read_sheet(b)
+        df = _normalizar(raw)
+        if df is None or df.empty:
+            continue
+        _write_parquet_sibling(bkt, b, df, _cabecalho(raw))
+        gerados.append(b.name)
+    return {"gerados": gerados, "pulados": pulados}
+
 # =========================
 # Utils
 # =========================
@@ -109,10 +412,10 @@ def _build_public_option(subset: pd.DataFrame, taxa_total: float) -> Dict[str, A
 def _build_private(subset: pd.DataFrame) -> Dict[str, Any]:
     return {
         "uids": subset["uid"].tolist(),
-        "fornecedores": [str(x) for x in subset["fornecedor"].tolist()],
+        "fornecedores": [("" if pd.isna(x) else str(x)) for x in subset["fornecedor"].tolist()],
         "blobs": [str(x) for x in subset["fonte"].tolist()],
         "creditos_individuais": [float(x) for x in subset["credito"].tolist()],
-        "parcelas_individuais": [str(x) for x in subset["parcelas_raw"].tolist()],
+        "parcelas_individuais": [("" if pd.isna(x) else str(x)) for x in subset["parcelas_raw"].tolist()],
         "vencimentos": [
             ("" if pd.isna(x) else x.strftime("%d/%m/%Y")) for x in subset["vencimento"].tolist()
         ],
@@ -121,79 +424,283 @@ def _build_private(subset: pd.DataFrame) -> Dict[str, Any]:
 # =========================
 # Solvers (minimize sum >= target; sem teto de cartas)
 # =========================
+def _subset_sums(arr: List[Tuple[float, int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Todas as 2^m somas de subconjuntos de arr (por duplicação, em NumPy) e a máscara de
+    bits de cada uma, ordenadas por soma. Empates seguem a ordem do combinations()
+    (menos itens primeiro, depois lexicográfica), como na versão em Python puro.
+    """
+    m = len(arr)
+    sums = np.zeros(1)
+    masks = np.zeros(1, dtype=np.int64)
+    qtd = np.zeros(1, dtype=np.int64)   # nº de itens do subconjunto
+    lex = np.zeros(1, dtype=np.int64)   # bits invertidos: maior = vem antes no combinations()
+    for k, (v, _) in enumerate(arr):
+        sums = np.concatenate([sums, sums + v])
+        masks = np.concatenate([masks, masks | (1 << k)])
+        qtd = np.concatenate([qtd, qtd + 1])
+        lex = np.concatenate([lex, lex | (1 << (m - 1 - k))])
+    order = np.lexsort((-lex, qtd, sums))
+    return sums[order], masks[order]
+
+def _mask_idxs(arr: List[Tuple[float, int]], mask: int) -> List[int]:
+    return [idx for k, (_, idx) in enumerate(arr) if mask >> k & 1]
+
+def _cota_gulosa(values: List[Tuple[float, int]], target: float) -> float:
+    # Cota superior gulosa (maiores primeiro até cobrir o alvo); inf se nem todas juntas cobrem
+    acc = 0.0
+    for v, _ in sorted(values, key=lambda x: -x[0]):
+        acc += v
+        if acc >= target:
+            return acc * (1.0 + 1e-9)  # folga para a soma acumulada em outra ordem
+    return float("inf")
+
+def _mitm_par(L_sums: np.ndarray, R_sums: np.ndarray, target: float, cota: float) -> Tuple[float, int, int]:
+    """
+    Melhor par (esquerda, direita) com soma >= target, os dois lados ordenados por soma.
+    Devolve (soma, i, j); j = -1 quando a esquerda sozinha já cobre o alvo.
+    """
+    # nenhum lado esquerdo acima da cota gulosa pode ser o ótimo
+    L_sums = L_sums[:int(np.searchsorted(L_sums, cota, side="right"))]
+
+    # Para cada soma da esquerda, a menor da direita que completa o alvo (bisect_left vetorizado)
+    need = target - L_sums
+    js = np.searchsorted(R_sums, need, side="left")
+    ok = js < len(R_sums)
+    js_c = np.minimum(js, len(R_sums) - 1)
+    totals = L_sums + R_sums[js_c]
+    totals = np.where(ok & (totals >= target), totals, np.inf)
+    sozinho = need <= 0  # a esquerda já cobre o alvo: não usa nada da direita
+    totals = np.where(sozinho, L_sums, totals)
+
+    i = int(np.argmin(totals))  # primeiro mínimo = mesmo desempate do laço original
+    return float(totals[i]), i, (-1 if sozinho[i] else int(js_c[i]))
+
 def _mitm_min_cover(values: List[Tuple[float, int]], target: float) -> Tuple[float, List[int]]:
+    cota = _cota_gulosa(values, target)
+    if cota == float("inf"):
+        return float("inf"), []
+
     n = len(values); m = n // 2
     left, right = values[:m], values[m:]
 
-    def all_sums(arr):
-        sums = []
-        for r in range(len(arr)+1):
-            for comb in combinations(arr, r):
-                s = sum(v for v, _ in comb)
-                idxs = [i for _, i in comb]
-                sums.append((s, idxs))
-        sums.sort(key=lambda x: x[0])
-        return sums
-
-    L, R = all_sums(left), all_sums(right)
-    import bisect
-    R_sums = [s for s, _ in R]
-
-    best_sum, best_idxs = float("inf"), []
-    for sL, iL in L:
-        need = target - sL
-        if need <= 0:
-            if sL < best_sum: best_sum, best_idxs = sL, iL
-            continue
-        j = bisect.bisect_left(R_sums, need)
-        if j < len(R):
-            s = sL + R[j][0]
-            if s >= target and s < best_sum:
-                best_sum, best_idxs = s, iL + R[j][1]
-    return best_sum, best_idxs
+    L_sums, L_masks = _subset_sums(left)
+    R_sums, R_masks = _subset_sums(right)
+    best_sum, i, j = _mitm_par(L_sums, R_sums, target, cota)
+    if best_sum == float("inf"):
+        return float("inf"), []
+    idxs = _mask_idxs(left, int(L_masks[i]))
+    if j >= 0:
+        idxs += _mask_idxs(right, int(R_masks[j]))
+    return best_sum, idxs
+
+def _multi_sums(itens: List[Tuple[float, List[int]]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Somas de todas as escolhas de 0..k cópias de cada valor (k = nº de cartas com esse
+    valor), ordenadas por soma (empate: menos cartas primeiro). A escolha vai codificada
+    em base mista (dígito u = quantas cartas do valor u).
+    """
+    sums = np.zeros(1)
+    codes = np.zeros(1, dtype=np.int64)
+    qtd = np.zeros(1, dtype=np.int64)
+    base = 1
+    for v, pos in itens:
+        ps, pc, pq = [sums], [codes], [qtd]
+        cur = sums
+        for k in range(1, len(pos) + 1):
+            cur = cur + v
+            ps.append(cur); pc.append(codes + k * base); pq.append(qtd + k)
+        sums, codes, qtd = np.concatenate(ps), np.concatenate(pc), np.concatenate(pq)
+        base *= len(pos) + 1
+    order = np.lexsort((qtd, sums))
+    return sums[order], codes[order]
+
+def _multi_idxs(itens: List[Tuple[float, List[int]]], code: int) -> List[int]:
+    idxs = []
+    for _, pos in itens:
+        k = code % (len(pos) + 1)
+        code //= len(pos) + 1
+        idxs += pos[:k]  # cartas de mesmo valor são intercambiáveis: as primeiras do grupo
+    return idxs
+
+def _mitm_multi_min_cover(values: List[Tuple[float, int]], target: float) -> Tuple[float, List[int]]:
+    """
+    MITM sobre valores distintos com multiplicidade: cartas de crédito igual viram um item
+    "0..k cópias", e cada metade enumera prod(k+1) escolhas em vez de 2^n.
+    """
+    cota = _cota_gulosa(values, target)
+    if cota == float("inf"):
+        return float("inf"), []
+
+    por_valor: Dict[float, List[int]] = {}
+    for v, idx in values:
+        por_valor.setdefault(v, []).append(idx)
+    itens = sorted(por_valor.items(), key=lambda x: -len(x[1]))
+
+    # metades com produtos (nº de escolhas) parecidos: cada item vai para a menor
+    left, right, pl, pr = [], [], 1, 1
+    for it in itens:
+        if pl <= pr:
+            left.append(it); pl *= len(it[1]) + 1
+        else:
+            right.append(it); pr *= len(it[1]) + 1
+
+    L_sums, L_codes = _multi_sums(left)
+    R_sums, R_codes = _multi_sums(right)
+    best_sum, i, j = _mitm_par(L_sums, R_sums, target, cota)
+    if best_sum == float("inf"):
+        return float("inf"), []
+    idxs = _multi_idxs(left, int(L_codes[i]))
+    if j >= 0:
+        idxs += _multi_idxs(right, int(R_codes[j]))
+    return best_sum, sorted(idxs)
+
+def _n_escolhas(values: List[Tuple[float, int]]) -> int:
+    # prod(k+1) sobre os créditos distintos = nº de escolhas que o MITM com multiplicidade enumera
+    cont: Dict[float, int] = {}
+    for v, _ in values:
+        cont[v] = cont.get(v, 0) + 1
+    return math.prod(k + 1 for k in cont.values())
 
 def _fptas_min_cover(values: List[Tuple[float, int]], target: float,
                      eps: float = None, max_states: int = None) -> Tuple[float, List[int]]:
     eps = eps or float(os.getenv("CODE_FPTAS_EPS", "0.01"))
     max_states = max_states or int(os.getenv("CODE_FPTAS_MAX", "5000"))
 
-    states: List[Tuple[float, List[int]]] = [(0.0, [])]
-    for v, idx in sorted(values, key=lambda x: -x[0]):
-        added = [(s+v, ids+[idx]) for (s, ids) in states]
-        merged = []
-        i = j = 0
-        states_sorted = states
-        added.sort(key=lambda x: x[0])
-
-        while i < len(states_sorted) or j < len(added):
-            if j >= len(added) or (i < len(states_sorted) and states_sorted[i][0] <= added[j][0]):
-                cand = states_sorted[i]; i += 1
-            else:
-                cand = added[j]; j += 1
-            if not merged or cand[0] > merged[-1][0]:
-                merged.append(cand)
-
-        trimmed = []
-        last = -1.0
-        for s, ids in merged:
-            if not trimmed:
-                trimmed.append((s, ids)); last = s
-            else:
-                if s >= last * (1.0 + eps):
-                    trimmed.append((s, ids)); last = s
-
-        if len(trimmed) > max_states:
-            step = math.ceil(len(trimmed) / max_states)
-            trimmed = trimmed[::step]
-        states = trimmed
-
-    for s, ids in states:
-        if s >= target:
-            return s, ids
-    return states[-1][0], states[-1][1]
+    # Estados = somas (crescentes, sem repetição) em array; em vez de carregar a lista de
+    # ids em cada estado, cada nível guarda de onde veio cada estado (índice na
+    # concatenação [anteriores, anteriores+v]) e o caminho é refeito uma vez no final.
+    ordem = sorted(values, key=lambda x: -x[0])
+    log_passo = math.log1p(eps / 2)
+    sums = np.zeros(1)
+    niveis: List[Tuple[int, np.ndarray]] = []  # (nº de estados anteriores, origem de cada estado)
+    for v, _ in ordem:
+        n_ant = len(sums)
+        cand = np.concatenate([sums, sums + v])
+        order = np.argsort(cand, kind="stable")  # empate: fica o estado sem o item
+        cand = cand[order]
+        primeiro = np.empty(len(cand), dtype=bool)
+        primeiro[0] = True
+        np.greater(cand[1:], cand[:-1], out=primeiro[1:])
+        order, cand = order[primeiro], cand[primeiro]
+
+        # trim: o menor e o maior estado de cada faixa floor(log_{1+eps/2}(s)) — somas já
+        # crescentes, então a faixa muda exatamente onde faixas[i] != faixas[i+1]. Manter o
+        # maior preserva a soma de todas as cartas até o fim: se o grupo cobre o alvo, o
+        # resultado também cobre (só com o menor, alvos perto do total ficavam descobertos).
+        faixas = np.floor(np.log(np.maximum(cand, 1e-300)) / log_passo).astype(np.int64)
+        borda = faixas[1:] != faixas[:-1]
+        primeiro = np.concatenate([[True], borda])
+        ultimo = np.concatenate([borda, [True]])
+        kept = np.flatnonzero(primeiro | ultimo)
+
+        if len(kept) > max_states:
+            step = math.ceil(len(kept) / max_states)
+            kept = np.append(kept[:-1][::step], kept[-1])  # o maior (soma total) fica sempre
+        sums = cand[kept]
+        niveis.append((n_ant, order[kept]))
+
+    f = int(np.searchsorted(sums, target, side="left"))
+    if f >= len(sums):
+        f = len(sums) - 1
+    best = float(sums[f])
+    ids: List[int] = []
+    for (v_idx, (n_ant, origem)) in zip(reversed(ordem), reversed(niveis)):
+        c = int(origem[f])
+        if c >= n_ant:
+            ids.append(v_idx[1])
+            c -= n_ant
+        f = c
+    ids.reverse()
+    return best, ids
 
 def _min_cover(values: List[Tuple[float, int]], target: float) -> Tuple[float, List[int]]:
-    return _mitm_min_cover(values, target) if len(values) <= 26 else _fptas_min_cover(values, target)
+    # Carta que sozinha já cobre o alvo só entra sozinha: basta a menor delas, e o
+    # solver roda só sobre as menores que o alvo (se elas juntas chegarem lá)
+    grandes = [x for x in values if x[0] >= target]
+    unica = min(grandes, key=lambda x: x[0]) if grandes else None
+    if grandes:
+        values = [x for x in values if x[0] < target]
+    total = sum(v for v, _ in values)
+    if not values or total < target:
+        # alvo <= 0 (ou todas as cartas >= alvo): não sobra nada para combinar
+        return (unica[0], [unica[1]]) if unica else (float("inf"), [])
+    best_sum, idxs = _min_cover_n(values, target)
+    if not idxs or best_sum < target:
+        # rede de segurança: as cartas todas juntas cobrem o alvo, mas o aproximado ficou
+        # abaixo ou o exato não achou nada (alvo == total e as somas em outra ordem dão 1 ulp a menos)
+        best_sum, idxs = total, [i for _, i in values]
+    if unica is not None and unica[0] <= best_sum:
+        return unica[0], [unica[1]]
+    return best_sum, idxs
+
+def _full_min_cover(values: List[Tuple[float, int]], target: float) -> Tuple[float, List[int]]:
+    # Poucas cartas: enumera as 2^n somas de uma vez e pega a primeira >= target
+    # (empate: menos cartas), sem dividir em metades
+    sums, masks = _subset_sums(values)
+    i = int(np.searchsorted(sums, target, side="left"))
+    if i >= len(sums):
+        return float("inf"), []
+    return float(sums[i]), _mask_idxs(values, int(masks[i]))
+
+# Até aqui a enumeração completa (2^n) ainda é mais rápida que o MITM (medido: ~20-50 µs
+# contra ~40-90 µs); acima o 2^n domina (n=12: 0,5 ms contra 0,1 ms; n=20: 20 ms contra 0,4 ms)
+_FULL_ENUM_MAX = 8
+
+def _min_cover_n(values: List[Tuple[float, int]], target: float) -> Tuple[float, List[int]]:
+    if len(values) <= _FULL_ENUM_MAX:
+        return _full_min_cover(values, target)
+    if len(values) <= 26:
+        return _mitm_min_cover(values, target)
+    # Muitos créditos repetidos: exato com multiplicidade se couber no mesmo orçamento (2^26)
+    if _n_escolhas(values) <= 1 << 26:
+        return _mitm_multi_min_cover(values, target)
+    return _fptas_min_cover(values, target)
+
+@lru_cache(maxsize=4096)
+def _min_cover_cached(values: Tuple[Tuple[float, int], ...], target: float) -> Tuple[float, Tuple[int, ...]]:
+    # Mesmo grupo + mesmo alvo = mesma solução (comissão/teto de entrada não entram no
+    # solver), então consultas repetidas ou que só mudam a comissão não recalculam
+    best_sum, idxs = _min_cover(list(values), target)
+    return best_sum, tuple(idxs)
+
+# Pool de processos para os grupos (opcional: CODE_SOLVER_PROCS > 1). Criado uma vez e
+# reaproveitado; "spawn" porque o servidor já tem threads (fork com threads é inseguro).
+_SOLVER_POOL: Optional[ProcessPoolExecutor] = None
+_SOLVER_POOL_LOCK = threading.Lock()
+
+def _solver_pool(procs: int) -> ProcessPoolExecutor:
+    global _SOLVER_POOL
+    with _SOLVER_POOL_LOCK:
+        if _SOLVER_POOL is None:
+            _SOLVER_POOL = ProcessPoolExecutor(max_workers=procs, mp_context=multiprocessing.get_context("spawn"))
+        return _SOLVER_POOL
+
+def _descartar_pool(pool: ProcessPoolExecutor):
+    global _SOLVER_POOL
+    with _SOLVER_POOL_LOCK:
+        if _SOLVER_POOL is pool:  # outro request pode já ter trocado o pool
+            _SOLVER_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _resolver_grupos(valores: List[Tuple[Tuple[float, int], ...]], target: float) -> List[Tuple[float, Tuple[int, ...]]]:
+    """
+    Resolve cada grupo (independentes entre si). Padrão: em série, com o cache de soluções.
+    Com CODE_SOLVER_PROCS > 1 e vários grupos, distribui em lotes entre processos.
+    """
+    procs = int(os.getenv("CODE_SOLVER_PROCS", "0"))
+    if procs <= 1 or len(valores) <= 1:
+        return [_min_cover_cached(v, target) for v in valores]
+    chunk = max(1, len(valores) // (4 * procs))
+    pool = _solver_pool(procs)
+    try:
+        return list(pool.map(_min_cover_cached, valores, [target] * len(valores), chunksize=chunk))
+    except BrokenProcessPool:
+        # um filho morreu (ex.: OOM kill): descarta o pool, o próximo request cria outro,
+        # e este termina em série
+        _log.warning("pool de solvers quebrado; recriando no próximo request")
+        _descartar_pool(pool)
+        return [_min_cover_cached(v, target) for v in valores]
 
 # =========================
 # API principal
@@ -214,29 +721,33 @@ def criar_juncao_sob_demanda(tipo: Optional[str],
     bucket = os.getenv("GCS_BUCKET", "planilhas-codecalc")
     pref = prefix or os.getenv("GCS_PREFIX", "")
 
-    base = _normalizar(_read_all_sheets(bucket, pref))
-    if base is None or base.empty:
+    if not _carregar_grupos(bucket, pref):
         return {"opcoes": [], "info": "Sem base de cartas no bucket."}
 
-    df = base.copy()
-    if tipo:
-        df = df[df["tipo"].str.lower() == str(tipo).lower()]
-    if df.empty:
+    grupos = _carregar_grupos(bucket, pref, tipo)
+    if not grupos:
         return {"opcoes": [], "info": "Nenhuma carta compatível com o tipo informado."}
 
-    opcoes: List[Dict[str, Any]] = []
-    for (_, _), grp in df.groupby(["administradora", "tipo"], dropna=False):
-        values = [(float(v or 0.0), int(i)) for i, v in enumerate(grp["credito"].tolist()) if float(v or 0.0) > 0]
-        if not values:
-            continue
+    # entrada = soma * taxa_total e o teto é soma * entrada_max: a comparação não depende
+    # do grupo, então se a taxa estoura o teto nenhum grupo passa — nem roda o solver
+    if (entrada_max is not None) and taxa_total > float(entrada_max):
+        return {"opcoes": [], "info": "Não foi possível montar junções dentro do teto de entrada."}
 
-        best_sum, idxs_local = _min_cover(values, float(credito_desejado or 0.0))
-        subset = grp.iloc[idxs_local]
+    itens = [(grp, values) for grp, values in grupos.values() if values]
+    alvo = round(float(credito_desejado or 0.0), 2)
+    solucoes = _resolver_grupos([values for _, values in itens], alvo)
 
-        entrada = best_sum * taxa_total
-        if (entrada_max is not None) and (entrada > best_sum * float(entrada_max)):
-            # sem solução que respeite teto de entrada nesse grupo
+    opcoes: List[Dict[str, Any]] = []
+    for (grp, values), (best_sum, idxs_local) in zip(itens, solucoes):
+        if not idxs_local:
+            continue  # o grupo inteiro não alcança o crédito desejado
+        if best_sum < alvo:
+            # não deveria acontecer: _min_cover cai em "todas as cartas" quando o total cobre
+            _log.warning("grupo %s/%s descartado: solução %.2f < alvo %.2f (total %.2f)",
+                         grp["administradora"].iloc[0], grp["tipo"].iloc[0], best_sum, alvo,
+                         sum(v for v, _ in values))
             continue
+        subset = grp.iloc[list(idxs_local)]
 
         pub = _build_public_option(subset, taxa_total)
         if return_private:
@@ -244,7 +755,7 @@ def criar_juncao_sob_demanda(tipo: Optional[str],
         opcoes.append(pub)
 
     if not opcoes:
-        return {"opcoes": [], "info": "Não foi possível montar junções dentro do teto de entrada."}
+        return {"opcoes": [], "info": "Nenhum grupo de cartas alcança o crédito desejado."}
 
     opcoes = sorted(opcoes, key=lambda x: (x["entrada"], x["credito_total"]))[:10]
     return {
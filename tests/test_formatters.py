@@ -0,0 +1,19 @@
+import pytest
+
+from formatters import only_ddmm
+
+
+@pytest.mark.parametrize("entrada, esperado", [
+    ("10/10/2025", "10/10"),
+    ("1/2/2025", "01/02"),
+    ("2025-10-05", "05/10"),
+    ("2025-1-5", "05/01"),
+    ("", ""),
+    # entradas fora do padrão passam sem mudança (ou só com o zfill de antes)
+    ("10/1x", "10/1x"),
+    ("10/1x/2025", "10/1x"),
+    ("2025-13-01", "2025-13-01"),
+    ("a vencer", "a vencer"),
+])
+def test_only_ddmm(entrada, esperado):
+    assert only_ddmm(entrada) == esperado
@@ -0,0 +1,66 @@
+import datetime as dt
+import glob
+import io
+import os
+
+import pandas as pd
+
+import planilha_processor as pp
+
+
+def test_sinonimos_resolvidos_por_planilha():
+    # "Entrada Fornecedor" numa planilha e "Entrada" na outra: cada uma usa a sua
+    a = pd.DataFrame({"Administradora": ["X"], "Tipo": ["Auto"], "Crédito": [1000],
+                      "Entrada Fornecedor": [100], "__fonte_blob__": ["a.xlsx"]})
+    b = pd.DataFrame({"Administradora": ["Y"], "Destino": ["Auto"], "Valor": ["R$ 3.000,00"],
+                      "Entrada": ["R$ 300,00"], "__fonte_blob__": ["b.xlsx"]})
+    assert pp._normalizar(a)["entrada_fornecedor"].tolist() == [100.0]
+    out = pp._normalizar(b)
+    assert out["credito"].tolist() == [3000.0]
+    assert out["entrada_fornecedor"].tolist() == [300.0]
+    assert out["fonte"].tolist() == ["b.xlsx"]
+
+
+def test_planilha_sem_administradora_nao_gera_linhas():
+    sem_adm = pd.DataFrame({"Tipo": ["Auto"], "Crédito": [5000]})
+    assert pp._normalizar(sem_adm).empty
+
+
+def test_vencimento_em_objetos_date():
+    # calamine (to_python) entrega datetime.date numa coluna object
+    s = pd.Series([dt.date(2025, 10, 10), None, dt.date(2025, 1, 2)], dtype=object)
+    out = pp._date_series(s)
+    assert pd.api.types.is_datetime64_any_dtype(out)
+    assert out.dt.strftime("%d/%m/%Y").fillna("").tolist() == ["10/10/2025", "", "02/01/2025"]
+    texto = pp._date_series(pd.Series(["10/11/2025", None], dtype=object))
+    assert texto.dt.strftime("%d/%m/%Y").fillna("").tolist() == ["10/11/2025", ""]
+
+
+def test_copia_parquet_volta_identica():
+    # parcela numérica (120) vira "120" nos dois caminhos: .xlsx e cópia Parquet
+    df = pd.DataFrame({"Administradora": ["X", "X", "Y"], "Tipo": ["Auto"] * 3,
+                       "Crédito": [1000, 2000, 3000], "Parcelas": [120, "1 a 10: R$ 1,00", None],
+                       "Fornecedor": ["F", None, 7], "__fonte_blob__": ["a.xlsx"] * 3})
+    out = pp._normalizar(df)
+    buf = io.BytesIO()
+    out.to_parquet(buf, engine="pyarrow", index=False)
+    volta = pd.read_parquet(io.BytesIO(buf.getvalue()), columns=pp._BASE_COLS)
+    pd.testing.assert_frame_equal(out, volta)
+    assert out["parcelas_raw"].tolist()[:2] == ["120", "1 a 10: R$ 1,00"]
+
+
+def test_calamine_e_openpyxl_normalizam_igual():
+    # _read_sheet usa calamine e cai no openpyxl: as planilhas de exemplo saem iguais nos dois
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    arquivos = glob.glob(os.path.join(raiz, "temp_*.xlsx"))
+    assert arquivos
+    for caminho in arquivos:
+        with open(caminho, "rb") as f:
+            data = f.read()
+        lidos = []
+        for engine in ("calamine", "openpyxl"):
+            df = pd.read_excel(io.BytesIO(data), engine=engine)
+            df["__fonte_blob__"] = os.path.basename(caminho)
+            lidos.append(pp._normalizar(df))
+        assert not lidos[0].empty
+        pd.testing.assert_frame_equal(lidos[0], lidos[1])
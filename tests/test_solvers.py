@@ -0,0 +1,134 @@
+import itertools
+import random
+
+import pytest
+
+import planilha_processor as pp
+
+
+def _grupo(rng, n):
+    # metade dos créditos repetidos (como nas planilhas reais), metade "quebrados"
+    repetidos = [50000, 75000, 100000, 120000.5, 150000, 200000, 33333.33]
+    pool = [rng.choice(repetidos) if rng.random() < 0.5 else round(rng.uniform(10000, 400000), 2)
+            for _ in range(n)]
+    return pool, [(v, i) for i, v in enumerate(pool)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_fptas_cobre_alvo_perto_do_total(seed):
+    # Alvo a 97-99,99% do total: o trim não pode descartar os estados que ainda cobrem
+    rng = random.Random(seed)
+    for _ in range(40):
+        pool, values = _grupo(rng, rng.randint(27, 80))
+        total = sum(pool)
+        alvo = total * rng.uniform(0.97, 0.9999)
+        best, idxs = pp._fptas_min_cover(values, alvo)
+        assert best >= alvo
+        assert sum(pool[i] for i in idxs) == pytest.approx(best)
+        assert len(set(idxs)) == len(idxs)
+
+
+def test_min_cover_grupo_grande_alvo_perto_do_total():
+    rng = random.Random(42)
+    for _ in range(100):
+        pool, values = _grupo(rng, rng.randint(27, 80))
+        alvo = round(sum(pool) * rng.uniform(0.97, 0.9999), 2)
+        best, idxs = pp._min_cover(values, alvo)
+        assert best >= alvo
+        assert sum(pool[i] for i in idxs) == pytest.approx(best)
+
+
+@pytest.mark.parametrize("n", [3, 8, 15, 26, 40, 120])
+def test_min_cover_nunca_fica_abaixo_do_alvo_quando_o_total_cobre(n):
+    # criar_juncao_sob_demanda descarta grupos com solução < alvo: isso só pode
+    # acontecer quando nem o grupo inteiro chega ao alvo
+    rng = random.Random(n)
+    for _ in range(30):
+        pool, values = _grupo(rng, n)
+        total = sum(pool)
+        alvo = round(total * rng.uniform(0.5, 1.02), 2)
+        best, idxs = pp._min_cover(values, alvo)
+        if total >= alvo:
+            assert best >= alvo and idxs
+        else:
+            assert best == float("inf") and not idxs
+
+
+def _forca_bruta(pool, alvo):
+    # menor soma >= alvo entre todos os subconjuntos (inf se nem todos juntos chegam)
+    melhor = float("inf")
+    for k in range(1, len(pool) + 1):
+        for comb in itertools.combinations(pool, k):
+            s = sum(comb)
+            if alvo <= s < melhor:
+                melhor = s
+    return melhor
+
+
+def _alvos(rng, pool):
+    total = sum(pool)
+    # alvo == total exato fica de fora: a soma em outra ordem pode dar 1 ulp abaixo
+    # (o _min_cover cobre esse caso devolvendo todas as cartas)
+    return [round(total * rng.uniform(0.05, 0.9), 2), round(total * rng.uniform(0.97, 0.9999), 2),
+            round(total - 0.01, 2), total + 1]
+
+
+def _confere(pool, alvo, best, idxs, exato=True, eps=0.0):
+    ref = _forca_bruta(pool, alvo)
+    if ref == float("inf"):
+        if exato:
+            assert best == float("inf") and not idxs
+        else:
+            assert best < alvo  # o FPTAS devolve a maior soma; o _min_cover filtra antes
+        return
+    assert best >= alvo - 1e-6
+    assert len(set(idxs)) == len(idxs)
+    assert sum(pool[i] for i in idxs) == pytest.approx(best)
+    if exato:
+        assert best == pytest.approx(ref)
+    else:
+        assert best <= ref * (1 + eps) + 1e-6
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_solvers_contra_forca_bruta(seed):
+    rng = random.Random(1000 + seed)
+    for _ in range(8):
+        # enumeração completa (até _FULL_ENUM_MAX) e MITM
+        for n in (rng.randint(1, pp._FULL_ENUM_MAX), rng.randint(pp._FULL_ENUM_MAX + 1, 13)):
+            pool, values = _grupo(rng, n)
+            solver = pp._full_min_cover if n <= pp._FULL_ENUM_MAX else pp._mitm_min_cover
+            for alvo in _alvos(rng, pool):
+                _confere(pool, alvo, *solver(values, alvo))
+                _confere(pool, alvo, *pp._min_cover(values, alvo))
+            best, idxs = pp._min_cover(values, sum(pool))
+            assert idxs and best == pytest.approx(sum(pool))
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_mitm_multi_contra_forca_bruta(seed):
+    # poucos créditos distintos, muito repetidos
+    rng = random.Random(2000 + seed)
+    for _ in range(8):
+        distintos = [round(rng.uniform(10000, 200000), 2) for _ in range(rng.randint(1, 4))]
+        pool = [rng.choice(distintos) for _ in range(rng.randint(2, 13))]
+        values = [(v, i) for i, v in enumerate(pool)]
+        for alvo in _alvos(rng, pool):
+            _confere(pool, alvo, *pp._mitm_multi_min_cover(values, alvo))
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_fptas_contra_forca_bruta(seed):
+    rng = random.Random(3000 + seed)
+    eps = 0.01
+    for _ in range(8):
+        pool, values = _grupo(rng, rng.randint(1, 13))
+        for alvo in _alvos(rng, pool):
+            _confere(pool, alvo, *pp._fptas_min_cover(values, alvo, eps=eps), exato=False, eps=eps)
+
+
+@pytest.mark.parametrize("alvo", [0, -10, 50])
+def test_min_cover_alvo_zero_ou_abaixo_da_menor_carta(alvo):
+    # todas as cartas cobrem sozinhas: a menor delas, nunca (0, [])
+    values = [(300.0, 0), (100.0, 1), (200.0, 2)]
+    assert pp._min_cover(values, alvo) == (100.0, [1])